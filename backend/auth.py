@@ -2,8 +2,12 @@
 Authentication utilities for JWT token generation and validation.
 Includes password hashing and verification.
 """
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from config import settings
@@ -11,6 +15,14 @@ from config import settings
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# SHA-256 of the access password, computed once for constant-time comparison
+_ACCESS_PASSWORD_DIGEST = hashlib.sha256(settings.ACCESS_PASSWORD.encode('utf-8', 'surrogatepass')).digest()
+
+# LRU of verified tokens -> (payload, exp). Entries are only trusted until the
+# token's own expiry, so expired tokens are still rejected.
+_TOKEN_CACHE: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+_TOKEN_CACHE_MAX = 4096
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -43,6 +55,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 def verify_token(token: str) -> Optional[dict]:
     """
     Verify a JWT token and return the payload.
+    Results are cached per token string until the token expires, so repeat
+    requests (e.g. media range requests) skip the signature check.
     
     Args:
         token: JWT token string
@@ -50,12 +64,24 @@ def verify_token(token: str) -> Optional[dict]:
     Returns:
         Token payload dictionary if valid, None otherwise
     """
+    cached = _TOKEN_CACHE.get(token)
+    if cached is not None:
+        if cached[1] > time.time():
+            _TOKEN_CACHE.move_to_end(token)
+            return cached[0]
+        del _TOKEN_CACHE[token]
+
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        return payload
     except JWTError:
         return None
 
+    if 'exp' in payload:
+        _TOKEN_CACHE[token] = (payload, payload['exp'])
+        if len(_TOKEN_CACHE) > _TOKEN_CACHE_MAX:
+            _TOKEN_CACHE.popitem(last=False)
+    return payload
+
 def check_access_password(password: str) -> bool:
     """
     Check if the provided password matches the access password.
@@ -66,5 +92,7 @@ def check_access_password(password: str) -> bool:
     Returns:
         True if password matches, False otherwise
     """
-    # For production, this should be hashed
-    return password == settings.ACCESS_PASSWORD
+    # Compare fixed-length digests in constant time to avoid leaking how much
+    # of the password matched through response timing
+    digest = hashlib.sha256(password.encode('utf-8', 'surrogatepass')).digest()
+    return hmac.compare_digest(digest, _ACCESS_PASSWORD_DIGEST)
@@ -4,10 +4,16 @@ Loads environment variables and provides configuration settings.
 """
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from backend/.env. Set USE_DOTENV=0 in deployments
+# that provide the environment directly to skip reading and parsing the file.
+ENV_FILE = Path(__file__).with_name(".env")
+if os.getenv("USE_DOTENV", "1") != "0" and ENV_FILE.is_file():
+    from dotenv import dotenv_values
+    for key, value in dotenv_values(ENV_FILE).items():
+        # Like load_dotenv(): variables already in the environment win
+        if value is not None:
+            os.environ.setdefault(key, value)
 
 class Settings:
     """Application settings loaded from environment variables."""
@@ -16,6 +22,12 @@ class Settings:
     ROOT_DIRECTORY: Path = Path(os.getenv("ROOT_DIRECTORY", "./files"))
     PORT: int = int(os.getenv("PORT", "8000"))
     HOST: str = os.getenv("HOST", "0.0.0.0")
+    # Worker processes when run via `python main.py`. Passkey challenges and
+    # token caches are per-process, so keep 1 unless requests are sticky.
+    # Stored passkey credentials are shared through SQLite.
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
+    # Development mode: auto-reload and access logging
+    DEV: bool = os.getenv("DEV", "") not in ("", "0")
     
     # Security settings
     ACCESS_PASSWORD: str = os.getenv("ACCESS_PASSWORD", "changeme")
@@ -25,11 +37,17 @@ class Settings:
     
     # CORS settings
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://49.232.185.68:3000")
+    # Reverse proxy offload: when enabled, file bodies are sent by nginx via
+    # X-Accel-Redirect to XACCEL_PREFIX + <relative path> (an internal location)
+    USE_XACCEL: bool = os.getenv("USE_XACCEL", "") not in ("", "0")
+    XACCEL_PREFIX: str = os.getenv("XACCEL_PREFIX", "/_protected/")
     # Upload settings
     UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))  # default 100MB
     
     # Ensure root directory exists
     def __init__(self):
         self.ROOT_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        # Resolve once; path checks on every request compare against this
+        self.ROOT_RESOLVED: Path = self.ROOT_DIRECTORY.resolve()
 
 settings = Settings()
@@ -3,34 +3,46 @@ Main FastAPI application for Personal Cloud Storage System.
 Provides API endpoints for authentication, file management, and media streaming.
 """
 import os
+import re
+import hashlib
 import mimetypes
+import operator
+from stat import S_ISDIR, S_ISREG
 from pathlib import Path
-from typing import Optional, List
-from datetime import datetime, timedelta
+from typing import Optional, List, Tuple
+from datetime import timedelta
+from functools import lru_cache
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlparse
 
 from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Body
 from fastapi import UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import Response, FileResponse, ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from cachetools import TTLCache
+import aiofiles
 
 from config import settings
 import base64
 import secrets
-import json
-from webauthn_store import store_credential, get_all_credentials, get_credential_by_id, update_sign_count, delete_credential
+# webauthn_store opens its SQLite database on import, so the passkey handlers
+# import it on first use rather than at application startup
 
-# Challenge store for register/login (simple in-memory store for single-user system)
-webauthn_challenges = {
-    'register': None,
-    'login': None
-}
+# Pending passkey ceremonies: flow_id -> (kind, challenge bytes). Each options
+# call starts its own flow, so concurrent ceremonies don't overwrite each other.
+# Entries expire after 120s and are consumed by the matching verify call.
+webauthn_challenges = TTLCache(maxsize=1024, ttl=120)
 from auth import create_access_token, verify_token, check_access_password
 
+# Load the system MIME tables once so per-file lookups are plain dict gets
+mimetypes.init()
+
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
@@ -38,17 +50,19 @@ limiter = Limiter(key_func=get_remote_address)
 app = FastAPI(
     title="Personal Cloud Storage API",
     description="High-performance file management and media streaming API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add rate limiting handler
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-# Configure CORS
+# Configure CORS. CORSMiddleware only tests membership, so a frozenset makes
+# the per-request origin check a hash lookup and drops duplicate entries.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[settings.FRONTEND_URL, "http://localhost:8900"],
+    allow_origins=frozenset({settings.FRONTEND_URL, "http://localhost:3000", "http://localhost:8900"}),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -57,6 +71,15 @@ app.add_middleware(
 # Security
 security = HTTPBearer()
 
+# Splits client paths on either separator style
+_SEP_RE = re.compile(r'[\\/]+')
+
+# Single byte range, e.g. "bytes=0-1023", "bytes=1024-" or "bytes=-500"
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+# Length of the resolved root path prefix, used to slice relative paths
+ROOT_PREFIX_LEN = len(os.path.join(str(settings.ROOT_RESOLVED), ''))
+
 # ============================================================================
 # Models
 # ============================================================================
@@ -76,7 +99,7 @@ class FileInfo(BaseModel):
     path: str
     is_directory: bool
     size: Optional[int] = None
-    modified_time: Optional[str] = None
+    modified_time: Optional[float] = None  # Unix timestamp in seconds
     file_type: Optional[str] = None
 
 class DirectoryListing(BaseModel):
@@ -121,17 +144,42 @@ async def verify_jwt_token(request: Request) -> dict:
 # Helper Functions
 # ============================================================================
 
-def get_file_type(file_path: Path) -> str:
+# Media types for the formats we stream. Checked before the mimetypes tables,
+# which come from the host (/etc/mime.types, the Windows registry) and miss
+# several of these on minimal systems.
+_MEDIA_MIME = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.flac': 'audio/flac',
+    '.ogg': 'audio/ogg',
+    '.oga': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.wav': 'audio/wav',
+    '.mp4': 'video/mp4',
+    '.m4v': 'video/mp4',
+    '.webm': 'video/webm',
+    '.mkv': 'video/x-matroska',
+    '.mov': 'video/quicktime',
+    '.ogv': 'video/ogg',
+}
+
+@lru_cache(maxsize=1024)
+def _mime_for_ext(ext: str) -> str:
     """
-    Determine file type based on extension.
-    
-    Args:
-        file_path: Path to the file
-        
-    Returns:
-        File type string (audio, video, image, document, other)
+    Look up the MIME type for a lowercase file extension (including the dot).
+    Returns an empty string for unknown extensions.
+    """
+    return (_MEDIA_MIME.get(ext) or mimetypes.types_map.get(ext)
+            or mimetypes.common_types.get(ext) or '')
+
+@lru_cache(maxsize=4096)
+def _classify_ext(ext: str) -> str:
     """
-    mime_type, _ = mimetypes.guess_type(str(file_path))
+    Classify a lowercase file extension (including the dot).
+    Memoized per extension since the result depends on nothing else.
+    """
+    mime_type = _mime_for_ext(ext)
     
     if mime_type:
         if mime_type.startswith('audio/'):
@@ -146,13 +194,25 @@ def get_file_type(file_path: Path) -> str:
     
     return 'other'
 
+def get_file_type(name: str) -> str:
+    """
+    Determine file type based on extension.
+    
+    Args:
+        name: File name (or path); matched case-insensitively
+        
+    Returns:
+        File type string (audio, video, image, document, other)
+    """
+    return _classify_ext(os.path.splitext(name)[1].lower())
+
 def safe_path_join(base: Path, user_path: str) -> Path:
     """
     Safely join user-provided path with base directory.
     Prevents directory traversal attacks.
     
     Args:
-        base: Base directory path
+        base: Resolved base directory path (normally settings.ROOT_RESOLVED)
         user_path: User-provided path component
         
     Returns:
@@ -164,22 +224,281 @@ def safe_path_join(base: Path, user_path: str) -> Path:
     # Normalize separators: accept both backslash and forward slash from clients
     # Remove leading slashes and split into path components to avoid accidental
     # path injection via .. or malformed separators.
-    import re
     user_path = user_path.lstrip('/\\')
     if user_path == "":
-        full_path = base.resolve()
+        return base
+    
+    if '/' in user_path or '\\' in user_path:
+        parts = [p for p in _SEP_RE.split(user_path) if p and p != '.' ]
     else:
-        parts = [p for p in re.split(r'[\\/]+', user_path) if p and p != '.' ]
-        full_path = base.joinpath(*parts).resolve()
+        # Flat name: nothing to split; resolve() below still handles '..'
+        parts = [user_path]
+    full_path = base.joinpath(*parts).resolve()
     
-    # Ensure the resolved path is within the base directory
+    # Ensure the resolved path is within the base directory. commonpath is a
+    # pure string comparison; it only raises for paths on different drives.
+    base_str = str(base)
     try:
-        full_path.relative_to(base.resolve())
+        inside = os.path.commonpath([str(full_path), base_str]) == base_str
     except ValueError:
+        inside = False
+    if not inside:
         raise HTTPException(status_code=403, detail="Access denied")
     
     return full_path
 
+class ZeroCopyFileResponse(FileResponse):
+    """
+    FileResponse for whole files that uses the ASGI zero-copy extension when
+    the server advertises it, and otherwise reads in 1MB chunks rather than
+    Starlette's default 64KB.
+    """
+    chunk_size = 1024 * 1024  # 1MB chunks
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] == 'HEAD' or 'http.response.zerocopy' not in scope.get('extensions', {}):
+            await super().__call__(scope, receive, send)
+            return
+
+        with open(self.path, 'rb') as f:
+            if self.stat_result is None:
+                self.set_stat_headers(os.fstat(f.fileno()))
+            await send({
+                'type': 'http.response.start',
+                'status': self.status_code,
+                'headers': self.raw_headers,
+            })
+            await send({'type': 'http.response.zerocopy', 'file': f, 'more_body': False})
+        if self.background is not None:
+            await self.background()
+
+class RangeFileResponse(Response):
+    """
+    206 Partial Content response for a single byte range of a file.
+
+    Uses the ASGI zero-copy extension when the server advertises it, so the
+    kernel moves bytes straight from the page cache to the socket. Otherwise
+    falls back to reading the range with aiofiles in large chunks.
+    """
+    chunk_size = 1024 * 1024  # 1MB chunks
+
+    def __init__(self, path: Path, start: int, end: int, file_size: int, media_type: str):
+        super().__init__(
+            status_code=206,
+            media_type=media_type,
+            headers={
+                'Content-Range': f'bytes {start}-{end}/{file_size}',
+                'Accept-Ranges': 'bytes',
+                'Content-Length': str(end - start + 1),
+            },
+        )
+        self.path = path
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            'type': 'http.response.start',
+            'status': self.status_code,
+            'headers': self.raw_headers,
+        })
+
+        count = self.end - self.start + 1
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            return
+
+        if 'http.response.zerocopy' in scope.get('extensions', {}):
+            with open(self.path, 'rb') as f:
+                await send({
+                    'type': 'http.response.zerocopy',
+                    'file': f,
+                    'offset': self.start,
+                    'count': count,
+                    'more_body': False,
+                })
+            return
+
+        async with aiofiles.open(self.path, 'rb') as f:
+            await f.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                data = await f.read(min(self.chunk_size, remaining))
+                if not data:
+                    # File shrank underneath us; Content-Length can no longer be
+                    # met, so leave the response incomplete and let the server
+                    # drop the connection
+                    break
+                remaining -= len(data)
+                await send({'type': 'http.response.body', 'body': data, 'more_body': remaining > 0})
+
+async def stat_file(file_path: Path) -> os.stat_result:
+    """
+    Stat a regular file without blocking the event loop.
+    A single os.stat() replaces separate exists()/is_file()/stat() calls.
+    
+    Args:
+        file_path: Resolved path to the file
+        
+    Returns:
+        The file's stat result
+        
+    Raises:
+        HTTPException: If the file does not exist or is not a regular file
+    """
+    try:
+        st = await run_in_threadpool(os.stat, file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    if not S_ISREG(st.st_mode):
+        raise HTTPException(status_code=400, detail="Path is not a file")
+    
+    return st
+
+def copy_upload(src, dest: Path, max_bytes: int) -> int:
+    """
+    Copy an uploaded file's spooled contents to `dest` in 1MB chunks.
+    Blocking; run it in the threadpool so the whole copy is one hop off the
+    event loop instead of one await per chunk.
+    
+    Args:
+        src: Binary file object to read from (UploadFile.file)
+        dest: Destination path, created or truncated
+        max_bytes: Size limit; copying stops once it is exceeded
+        
+    Returns:
+        Bytes read, which is greater than max_bytes if the limit was hit
+    """
+    written = 0
+    with open(dest, 'wb') as out_f:
+        while True:
+            chunk = src.read(1024 * 1024)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                break
+            out_f.write(chunk)
+    return written
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[str]) -> bool:
+    """
+    Evaluate the request's conditional headers against a response's validators.
+    If-None-Match takes precedence over If-Modified-Since (RFC 7232).
+    
+    Args:
+        request: Incoming request
+        etag: The response's ETag header value
+        last_modified: The response's Last-Modified header value (HTTP-date)
+        
+    Returns:
+        True if a 304 Not Modified should be sent instead of the body
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        if not etag:
+            return False
+        # Weak comparison: ignore the W/ prefix on either side
+        etag = etag[2:] if etag.startswith('W/') else etag
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == etag:
+                return True
+        return False
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def xaccel_response(file_path: Path, media_type: str, filename: Optional[str] = None) -> Response:
+    """
+    Hand the file body off to nginx with an X-Accel-Redirect header.
+    
+    Args:
+        file_path: Resolved path to the file (inside the root directory)
+        media_type: Content-Type for the response
+        filename: If given, send as an attachment with this filename
+        
+    Returns:
+        Empty response carrying the redirect headers
+    """
+    rel_path = str(file_path)[ROOT_PREFIX_LEN:]
+    if os.sep != '/':
+        rel_path = rel_path.replace(os.sep, '/')
+    
+    headers = {'X-Accel-Redirect': settings.XACCEL_PREFIX + quote(rel_path)}
+    if filename:
+        headers['Content-Disposition'] = f"attachment; filename*=utf-8''{quote(filename)}"
+    
+    return Response(media_type=media_type, headers=headers)
+
+async def stream_file(file_path: Path, range_header: Optional[str], default_mime: str) -> Response:
+    """
+    Build a streaming response for a media file with range request support.
+
+    Args:
+        file_path: Resolved path to the file
+        range_header: Value of the Range request header, if any
+        default_mime: MIME type used when the file's own type does not match
+            the family of `default_mime` (e.g. audio/mpeg for audio streams)
+
+    Returns:
+        FileResponse for the whole file, or RangeFileResponse for a byte range
+
+    Raises:
+        HTTPException: If the file does not exist (404), is not a regular
+            file (400), or the range is malformed or unsatisfiable (416)
+    """
+    st = await stat_file(file_path)
+
+    ext = file_path.suffix.lower()
+    if _classify_ext(ext) == default_mime.split('/', 1)[0]:
+        mime_type = _mime_for_ext(ext)
+    else:
+        mime_type = default_mime
+
+    if settings.USE_XACCEL:
+        # nginx serves the body and handles Range itself
+        return xaccel_response(file_path, mime_type)
+
+    # RFC 7233 lets a server ignore Range and send the whole file: do so for
+    # other range units and for multi-range requests, which would otherwise
+    # need a multipart/byteranges body
+    if not range_header or not range_header.lstrip().startswith('bytes=') or ',' in range_header:
+        return ZeroCopyFileResponse(
+            str(file_path),
+            media_type=mime_type,
+            headers={'Accept-Ranges': 'bytes'},
+            stat_result=st
+        )
+
+    file_size = st.st_size
+    range_match = _RANGE_RE.fullmatch(range_header.strip())
+    first, last = range_match.groups() if range_match else ('', '')
+    if first:
+        start = int(first)
+        end = min(int(last), file_size - 1) if last else file_size - 1
+    elif last:
+        # Suffix range: the final `last` bytes of the file
+        start = max(file_size - int(last), 0)
+        end = file_size - 1
+    else:
+        start, end = 0, -1
+
+    if start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={'Content-Range': f'bytes */{file_size}'}
+        )
+
+    return RangeFileResponse(file_path, start, end, file_size, mime_type)
+
 # ============================================================================
 # API Endpoints
 # ============================================================================
@@ -194,20 +513,53 @@ async def root():
     }
 
 
+# Padding needed to restore an unpadded base64url string, indexed by len % 4
+_B64_PAD = ('', '===', '==', '=')
+
+
 def b64encode(data: bytes) -> str:
-    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
 
 
 def b64decode(data: str) -> bytes:
-    padding = '=' * (-len(data) % 4)
-    return base64.urlsafe_b64decode(data + padding)
+    return base64.urlsafe_b64decode(data + _B64_PAD[len(data) & 3])
+
+
+# WebAuthn relying party: rp_id is the FRONTEND_URL host, parsed once
+_RP_ID = urlparse(settings.FRONTEND_URL).hostname
+_EXPECTED_ORIGIN = settings.FRONTEND_URL
 
 
 def get_rp_id():
-    # Derive rp_id from FRONTEND_URL host
-    from urllib.parse import urlparse
-    parsed = urlparse(settings.FRONTEND_URL)
-    return parsed.hostname
+    return _RP_ID
+
+
+def start_webauthn_flow(kind: str) -> Tuple[str, str]:
+    """
+    Create a challenge for a register/login ceremony.
+    
+    Returns:
+        (flow_id, base64url challenge) to send to the client
+    """
+    challenge_bytes = secrets.token_bytes(32)
+    flow_id = secrets.token_urlsafe(12)
+    webauthn_challenges[flow_id] = (kind, challenge_bytes)
+    return flow_id, b64encode(challenge_bytes)
+
+
+def pop_webauthn_challenge(payload: dict, kind: str) -> Optional[bytes]:
+    """
+    Consume the challenge for the flow named by payload['flow_id'].
+    Removes `flow_id` from the payload before it goes to the verifier.
+    
+    Returns:
+        The challenge bytes, or None if the flow is unknown, expired or of
+        another kind
+    """
+    flow = webauthn_challenges.pop(payload.pop('flow_id', None), None)
+    if flow is None or flow[0] != kind:
+        return None
+    return flow[1]
 
 @app.post("/api/auth/login", response_model=LoginResponse)
 @limiter.limit("5/minute")
@@ -240,16 +592,16 @@ async def login(request: Request, login_data: LoginRequest):
 
 @app.get('/api/auth/passkey/exists')
 async def passkey_exists():
+    from webauthn_store import get_all_credentials
     creds = get_all_credentials()
     return {'exists': len(creds) > 0}
 
 
 @app.get('/api/auth/passkey/register/options')
 async def passkey_register_options(payload: dict = Depends(verify_jwt_token)):
+    from webauthn_store import get_all_credentials
     # Generate a new challenge
-    challenge_bytes = secrets.token_bytes(32)
-    challenge = b64encode(challenge_bytes)
-    webauthn_challenges['register'] = challenge
+    flow_id, challenge = start_webauthn_flow('register')
 
     rp = {
         'name': 'Personal Cloud Storage',
@@ -264,6 +616,7 @@ async def passkey_register_options(payload: dict = Depends(verify_jwt_token)):
         exclude_credentials.append({'type': 'public-key', 'id': c['credential_id']})
 
     options = {
+        'flow_id': flow_id,
         'challenge': challenge,
         'rp': rp,
         'user': {
@@ -288,9 +641,10 @@ async def passkey_register_options(payload: dict = Depends(verify_jwt_token)):
 @app.post('/api/auth/passkey/register/verify')
 async def passkey_register_verify(request: Request, payload: dict = Body(...), jwt_payload: dict = Depends(verify_jwt_token)):
     try:
+        from webauthn_store import store_credential
         # This endpoint verifies the attestation object from the client and stores credential
         # Payload is expected to be the registration response from navigator.credentials.create()
-        expected_challenge = webauthn_challenges.get('register')
+        expected_challenge = pop_webauthn_challenge(payload, 'register')
         if not expected_challenge:
             raise HTTPException(status_code=400, detail="Missing challenge; request registration options first")
 
@@ -301,7 +655,7 @@ async def passkey_register_verify(request: Request, payload: dict = Body(...), j
         registration_response = payload
 
         # expected values
-        expected_origin = settings.FRONTEND_URL
+        expected_origin = _EXPECTED_ORIGIN
         expected_rp_id = get_rp_id()
 
         verification = verify_registration_response(
@@ -327,14 +681,13 @@ async def passkey_register_verify(request: Request, payload: dict = Body(...), j
 
 @app.get('/api/auth/passkey/login/options')
 async def passkey_login_options():
+    from webauthn_store import get_all_credentials
     # If we have credentials, return allowCredentials and a challenge
     creds = get_all_credentials()
     if not creds:
         return {'allowCredentials': [], 'challenge': None}
 
-    challenge_bytes = secrets.token_bytes(32)
-    challenge = b64encode(challenge_bytes)
-    webauthn_challenges['login'] = challenge
+    flow_id, challenge = start_webauthn_flow('login')
 
     allow_credentials = []
     for c in creds:
@@ -345,6 +698,7 @@ async def passkey_login_options():
         })
 
     options = {
+        'flow_id': flow_id,
         'challenge': challenge,
         'allowCredentials': allow_credentials,
         'timeout': 60000,
@@ -357,6 +711,7 @@ async def passkey_login_options():
 
 @app.get('/api/auth/passkey/list')
 async def passkey_list(jwt_payload: dict = Depends(verify_jwt_token)):
+    from webauthn_store import get_all_credentials
     creds = get_all_credentials()
     # Return minimal public info to client (no public_key)
     return [{'credential_id': c['credential_id'], 'transports': c['transports'], 'created_at': c['created_at']} for c in creds]
@@ -364,6 +719,7 @@ async def passkey_list(jwt_payload: dict = Depends(verify_jwt_token)):
 
 @app.delete('/api/auth/passkey/{credential_id}')
 async def passkey_delete(credential_id: str, jwt_payload: dict = Depends(verify_jwt_token)):
+    from webauthn_store import get_credential_by_id, delete_credential
     cred = get_credential_by_id(credential_id)
     if not cred:
         raise HTTPException(status_code=404, detail='Credential not found')
@@ -374,7 +730,8 @@ async def passkey_delete(credential_id: str, jwt_payload: dict = Depends(verify_
 @app.post('/api/auth/passkey/login/verify')
 async def passkey_login_verify(request: Request, payload: dict = Body(...)):
     try:
-        expected_challenge = webauthn_challenges.get('login')
+        from webauthn_store import get_credential_by_id, update_sign_count
+        expected_challenge = pop_webauthn_challenge(payload, 'login')
         if not expected_challenge:
             raise HTTPException(status_code=400, detail='Missing login challenge; request options first')
 
@@ -386,7 +743,7 @@ async def passkey_login_verify(request: Request, payload: dict = Body(...)):
         if not cred:
             raise HTTPException(status_code=400, detail='Unknown credential')
 
-        expected_origin = settings.FRONTEND_URL
+        expected_origin = _EXPECTED_ORIGIN
         expected_rp_id = get_rp_id()
 
         verification = verify_authentication_response(
@@ -407,8 +764,13 @@ async def passkey_login_verify(request: Request, payload: dict = Body(...)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f'Passkey login verification failed: {str(e)}')
 
-@app.get("/api/files/list", response_model=DirectoryListing)
+@app.get(
+    "/api/files/list",
+    response_model=None,
+    responses={200: {"model": DirectoryListing}}
+)
 async def list_files(
+    request: Request,
     path: str = Query("", description="Directory path to list"),
     sort_by: str = Query("name", description="Sort by: name, size, modified"),
     search: Optional[str] = Query(None, description="Search query"),
@@ -416,8 +778,11 @@ async def list_files(
 ):
     """
     List files and directories in the specified path.
+    Sends a weak ETag derived from the listed entries and answers
+    304 Not Modified when the client already has the current listing.
     
     Args:
+        request: Request object (for If-None-Match)
         path: Relative path from root directory
         sort_by: Sort field (name, size, modified)
         search: Optional search query
@@ -430,50 +795,85 @@ async def list_files(
         HTTPException: If path is invalid or access is denied
     """
     try:
-        directory = safe_path_join(settings.ROOT_DIRECTORY, path)
+        directory = safe_path_join(settings.ROOT_RESOLVED, path)
         
-        if not directory.exists():
+        try:
+            dir_stat = os.stat(directory)
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="Directory not found")
         
-        if not directory.is_dir():
+        if not S_ISDIR(dir_stat.st_mode):
             raise HTTPException(status_code=400, detail="Path is not a directory")
         
-        # Get all items in directory
-        items = []
-        for item in directory.iterdir():
-            try:
-                stat = item.stat()
-                
-                # Apply search filter if provided
-                if search and search.lower() not in item.name.lower():
+        # Get all items in directory. DirEntry caches the file type from the
+        # directory read, so each entry costs at most one stat() call.
+        search_lower = search.lower() if search else None
+        # Rows are (sort_key, file_info); the key for the requested order is
+        # computed once per entry instead of once per comparison
+        by_size = sort_by == "size"
+        by_modified = sort_by == "modified"
+        rows = []
+        # The ETag covers every listed entry's name, mtime and size: editing a
+        # file in place does not touch the directory's own mtime
+        digest = hashlib.blake2b(digest_size=8)
+        with os.scandir(directory) as it:
+            for entry in it:
+                name_lower = entry.name.lower()
+                # Apply search filter before touching the filesystem again
+                if search_lower and search_lower not in name_lower:
                     continue
                 
-                file_info = FileInfo(
-                    name=item.name,
-                    path=item.relative_to(settings.ROOT_DIRECTORY).as_posix(),
-                    is_directory=item.is_dir(),
-                    size=stat.st_size if item.is_file() else None,
-                    modified_time=datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    file_type=get_file_type(item) if item.is_file() else "folder"
-                )
-                items.append(file_info)
-            except (PermissionError, OSError):
-                # Skip items we can't access
-                continue
+                try:
+                    is_dir = entry.is_dir()
+                    is_file = not is_dir and entry.is_file()
+                    stat = entry.stat()
+                    size = stat.st_size if is_file else None
+                    rel_path = entry.path[ROOT_PREFIX_LEN:]
+                    if os.sep != '/':
+                        rel_path = rel_path.replace(os.sep, '/')
+                    
+                    # Plain dict in the FileInfo shape; the data comes from the
+                    # filesystem, so per-entry model validation is skipped
+                    file_info = {
+                        'name': entry.name,
+                        'path': rel_path,
+                        'is_directory': is_dir,
+                        'size': size,
+                        'modified_time': stat.st_mtime,
+                        'file_type': get_file_type(entry.name) if is_file else "folder"
+                    }
+                    if by_size:
+                        sort_key = size or 0
+                    elif by_modified:
+                        sort_key = stat.st_mtime
+                    else:  # name: folders first, then case-insensitive name
+                        sort_key = (not is_dir, name_lower)
+                    rows.append((sort_key, file_info))
+                    digest.update(f'{entry.name}\0{stat.st_mtime_ns:x}\0{stat.st_size:x}\n'.encode())
+                except (PermissionError, OSError):
+                    # Skip items we can't access
+                    continue
         
-        # Sort items
-        if sort_by == "size":
-            items.sort(key=lambda x: x.size or 0, reverse=True)
-        elif sort_by == "modified":
-            items.sort(key=lambda x: x.modified_time or "", reverse=True)
-        else:  # name
-            items.sort(key=lambda x: (not x.is_directory, x.name.lower()))
+        # No Last-Modified: the directory's mtime misses in-place edits, so
+        # If-Modified-Since would answer 304 for a changed listing
+        etag = f'W/"{digest.hexdigest()}"'
+        cache_headers = {
+            'ETag': etag,
+            # Cacheable, but always revalidated so uploads show up immediately
+            'Cache-Control': 'private, no-cache'
+        }
+        if is_not_modified(request, etag, None):
+            return Response(status_code=304, headers=cache_headers)
         
-        return DirectoryListing(
-            path=path,
-            items=items,
-            total=len(items)
-        )
+        # Sort items (size and modified are newest/largest first)
+        rows.sort(key=operator.itemgetter(0), reverse=by_size or by_modified)
+        items = [file_info for _, file_info in rows]
+        
+        return ORJSONResponse({
+            'path': path,
+            'items': items,
+            'total': len(items)
+        }, headers=cache_headers)
         
     except HTTPException:
         raise
@@ -482,13 +882,16 @@ async def list_files(
 
 @app.get("/api/files/download")
 async def download_file(
+    request: Request,
     path: str = Query(..., description="File path to download"),
     payload: dict = Depends(verify_jwt_token)
 ):
     """
-    Download a file with range request support.
+    Download a file. Answers 304 Not Modified when the client's
+    If-None-Match / If-Modified-Since still match the file.
     
     Args:
+        request: Request object (for conditional headers)
         path: Relative path to the file
         payload: JWT token payload
         
@@ -499,19 +902,24 @@ async def download_file(
         HTTPException: If file not found or access denied
     """
     try:
-        file_path = safe_path_join(settings.ROOT_DIRECTORY, path)
-        
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="File not found")
+        file_path = safe_path_join(settings.ROOT_RESOLVED, path)
+        st = await stat_file(file_path)
         
-        if not file_path.is_file():
-            raise HTTPException(status_code=400, detail="Path is not a file")
+        if settings.USE_XACCEL:
+            return xaccel_response(file_path, 'application/octet-stream', filename=file_path.name)
         
-        return FileResponse(
+        response = ZeroCopyFileResponse(
             path=str(file_path),
             filename=file_path.name,
-            media_type='application/octet-stream'
+            media_type='application/octet-stream',
+            stat_result=st
         )
+        etag = response.headers.get('etag')
+        last_modified = response.headers.get('last-modified')
+        if is_not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers={'ETag': etag, 'Last-Modified': last_modified})
+        
+        return response
         
     except HTTPException:
         raise
@@ -572,53 +980,8 @@ async def stream_audio(
                 raise HTTPException(status_code=401, detail="Missing authentication token")
             await verify_jwt_token(request)
 
-        file_path = safe_path_join(settings.ROOT_DIRECTORY, path)
-        
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        file_size = file_path.stat().st_size
-        mime_type, _ = mimetypes.guess_type(str(file_path))
-        
-        if not mime_type or not mime_type.startswith('audio/'):
-            mime_type = 'audio/mpeg'  # Default to MP3
-        
-        # Handle range requests
-        start = 0
-        end = file_size - 1
-        
-        if range:
-            range_match = range.replace('bytes=', '').split('-')
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if len(range_match) > 1 and range_match[1] else end
-        
-        # Generator function for streaming
-        async def iterfile():
-            with open(file_path, 'rb') as f:
-                f.seek(start)
-                remaining = end - start + 1
-                chunk_size = 64 * 1024  # 64KB chunks
-                
-                while remaining > 0:
-                    chunk_size = min(chunk_size, remaining)
-                    data = f.read(chunk_size)
-                    if not data:
-                        break
-                    remaining -= len(data)
-                    yield data
-        
-        headers = {
-            'Content-Range': f'bytes {start}-{end}/{file_size}',
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(end - start + 1),
-        }
-        
-        return StreamingResponse(
-            iterfile(),
-            media_type=mime_type,
-            headers=headers,
-            status_code=206 if range else 200
-        )
+        file_path = safe_path_join(settings.ROOT_RESOLVED, path)
+        return await stream_file(file_path, range, 'audio/mpeg')
         
     except HTTPException:
         raise
@@ -642,11 +1005,11 @@ async def create_folder(
         if not name or '/' in name or '\\' in name or name in ('..', '.'):
             raise HTTPException(status_code=400, detail='Invalid folder name')
 
-        dest_path = safe_path_join(settings.ROOT_DIRECTORY, (parent or '').strip('/\\'))
+        dest_path = safe_path_join(settings.ROOT_RESOLVED, (parent or '').strip('/\\'))
         new_dir = dest_path.joinpath(name).resolve()
         # ensure inside root
         try:
-            new_dir.relative_to(settings.ROOT_DIRECTORY.resolve())
+            new_dir.relative_to(settings.ROOT_RESOLVED)
         except ValueError:
             raise HTTPException(status_code=403, detail='Invalid folder path')
 
@@ -654,7 +1017,7 @@ async def create_folder(
             raise HTTPException(status_code=409, detail='Folder already exists')
 
         new_dir.mkdir(parents=False, exist_ok=False)
-        return {'status': 'created', 'path': new_dir.relative_to(settings.ROOT_DIRECTORY).as_posix()}
+        return {'status': 'created', 'path': new_dir.relative_to(settings.ROOT_RESOLVED).as_posix()}
     except HTTPException:
         raise
     except Exception as e:
@@ -673,7 +1036,19 @@ async def upload_file(
     Upload a file to server, safe handling and size limiting applied.
     """
     try:
-        parent = safe_path_join(settings.ROOT_DIRECTORY, (path or '').strip('/\\'))
+        # Reject oversized uploads before touching the destination. UploadFile.size
+        # is exact once the multipart body is parsed; Content-Length, which also
+        # counts the multipart framing, is the fallback.
+        max_bytes = settings.UPLOAD_MAX_BYTES
+        declared_size = file.size
+        if declared_size is None:
+            content_length = request.headers.get('content-length')
+            if content_length and content_length.isdigit():
+                declared_size = int(content_length)
+        if declared_size is not None and declared_size > max_bytes:
+            raise HTTPException(status_code=413, detail='File too large')
+
+        parent = safe_path_join(settings.ROOT_RESOLVED, (path or '').strip('/\\'))
 
         # Sanitize filename
         filename = os.path.basename(file.filename)
@@ -685,7 +1060,7 @@ async def upload_file(
         # target file path
         dest = parent.joinpath(filename).resolve()
         try:
-            dest.relative_to(settings.ROOT_DIRECTORY.resolve())
+            dest.relative_to(settings.ROOT_RESOLVED)
         except ValueError:
             raise HTTPException(status_code=403, detail='Invalid upload path')
 
@@ -693,22 +1068,13 @@ async def upload_file(
         if dest.exists():
             raise HTTPException(status_code=409, detail='File already exists')
 
-        # Stream to disk and enforce size
-        max_bytes = settings.UPLOAD_MAX_BYTES
-        written = 0
-        with open(dest, 'wb') as out_f:
-            while True:
-                chunk = await file.read(64 * 1024)
-                if not chunk:
-                    break
-                written += len(chunk)
-                if written > max_bytes:
-                    out_f.close()
-                    os.remove(dest)
-                    raise HTTPException(status_code=413, detail='File too large')
-                out_f.write(chunk)
-
-        return {'status': 'uploaded', 'path': dest.relative_to(settings.ROOT_DIRECTORY).as_posix(), 'size': written}
+        # Stream to disk and enforce size again in case the declared size lied
+        written = await run_in_threadpool(copy_upload, file.file, dest, max_bytes)
+        if written > max_bytes:
+            os.remove(dest)
+            raise HTTPException(status_code=413, detail='File too large')
+
+        return {'status': 'uploaded', 'path': dest.relative_to(settings.ROOT_RESOLVED).as_posix(), 'size': written}
     except HTTPException:
         raise
     except Exception as e:
@@ -751,53 +1117,8 @@ async def stream_video(
                 raise HTTPException(status_code=401, detail="Missing authentication token")
             await verify_jwt_token(request)
 
-        file_path = safe_path_join(settings.ROOT_DIRECTORY, path)
-        
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        file_size = file_path.stat().st_size
-        mime_type, _ = mimetypes.guess_type(str(file_path))
-        
-        if not mime_type or not mime_type.startswith('video/'):
-            mime_type = 'video/mp4'  # Default to MP4
-        
-        # Handle range requests
-        start = 0
-        end = file_size - 1
-        
-        if range:
-            range_match = range.replace('bytes=', '').split('-')
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if len(range_match) > 1 and range_match[1] else end
-        
-        # Generator function for streaming
-        async def iterfile():
-            with open(file_path, 'rb') as f:
-                f.seek(start)
-                remaining = end - start + 1
-                chunk_size = 256 * 1024  # 256KB chunks for video
-                
-                while remaining > 0:
-                    chunk_size = min(chunk_size, remaining)
-                    data = f.read(chunk_size)
-                    if not data:
-                        break
-                    remaining -= len(data)
-                    yield data
-        
-        headers = {
-            'Content-Range': f'bytes {start}-{end}/{file_size}',
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(end - start + 1),
-        }
-        
-        return StreamingResponse(
-            iterfile(),
-            media_type=mime_type,
-            headers=headers,
-            status_code=206 if range else 200
-        )
+        file_path = safe_path_join(settings.ROOT_RESOLVED, path)
+        return await stream_file(file_path, range, 'video/mp4')
         
     except HTTPException:
         raise
@@ -809,10 +1130,16 @@ async def stream_video(
 # ============================================================================
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     uvicorn.run(
         "main:app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=True
+        reload=settings.DEV,
+        workers=None if settings.DEV else settings.WORKERS,
+        # uvloop is not available on Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        access_log=settings.DEV
     )
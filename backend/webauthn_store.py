@@ -2,6 +2,7 @@ import sqlite3
 import os
 import base64
 import json
+import threading
 from datetime import datetime
 
 DB_FILE = os.path.join(os.path.dirname(__file__), 'webauthn.db')
@@ -18,81 +19,83 @@ CREATE TABLE IF NOT EXISTS credentials (
 '''
 
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute(CREATE_TABLE_SQL)
-    conn.commit()
-    conn.close()
+# One connection for the process, in autocommit mode. WAL lets readers run
+# alongside the occasional write; the lock serialises use of the connection.
+_CONN = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
+_CONN.execute('PRAGMA journal_mode=WAL')
+_CONN.execute('PRAGMA synchronous=NORMAL')
+_CONN.row_factory = sqlite3.Row
+_LOCK = threading.Lock()
+
+# credential_id -> credential dict, served instead of querying the database.
+# Other processes (uvicorn workers) can write too: PRAGMA data_version changes
+# whenever another connection commits, and the cache is then reloaded.
+_CRED_CACHE: dict = {}
+_DATA_VERSION = None
+
+SELECT_SQL = 'SELECT id, credential_id, public_key, sign_count, transports, created_at FROM credentials'
+
 
+def _reload_cache():
+    # Caller holds _LOCK
+    global _DATA_VERSION
+    _DATA_VERSION = _CONN.execute('PRAGMA data_version').fetchone()[0]
+    _CRED_CACHE.clear()
+    for r in _CONN.execute(SELECT_SQL):
+        _CRED_CACHE[r['credential_id']] = dict(r)
 
-def _get_conn():
-    conn = sqlite3.connect(DB_FILE)
-    return conn
+
+def _sync_cache():
+    # Caller holds _LOCK. Own writes keep the cache current and leave
+    # data_version alone; only another connection's commit triggers a reload.
+    if _CONN.execute('PRAGMA data_version').fetchone()[0] != _DATA_VERSION:
+        _reload_cache()
+
+
+def init_db():
+    # credential_id is UNIQUE, so SQLite already keeps an index on it
+    with _LOCK:
+        _CONN.execute(CREATE_TABLE_SQL)
+        _reload_cache()
 
 
 def store_credential(credential_id: str, public_key: str, sign_count: int, transports: str = ''):
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        'INSERT OR REPLACE INTO credentials (credential_id, public_key, sign_count, transports, created_at) VALUES (?, ?, ?, ?, ?)',
-        (credential_id, public_key, sign_count, transports, datetime.utcnow().isoformat())
-    )
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        _sync_cache()
+        _CONN.execute(
+            'INSERT OR REPLACE INTO credentials (credential_id, public_key, sign_count, transports, created_at) VALUES (?, ?, ?, ?, ?)',
+            (credential_id, public_key, sign_count, transports, datetime.utcnow().isoformat())
+        )
+        r = _CONN.execute(SELECT_SQL + ' WHERE credential_id=?', (credential_id,)).fetchone()
+        _CRED_CACHE[credential_id] = dict(r)
 
 
 def get_all_credentials():
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute('SELECT id, credential_id, public_key, sign_count, transports, created_at FROM credentials')
-    rows = cur.fetchall()
-    conn.close()
-    creds = []
-    for r in rows:
-        creds.append({
-            'id': r[0],
-            'credential_id': r[1],
-            'public_key': r[2],
-            'sign_count': r[3],
-            'transports': r[4],
-            'created_at': r[5]
-        })
-    return creds
+    with _LOCK:
+        _sync_cache()
+        return list(_CRED_CACHE.values())
 
 
 def get_credential_by_id(credential_id: str):
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute('SELECT id, credential_id, public_key, sign_count, transports, created_at FROM credentials WHERE credential_id=?', (credential_id,))
-    r = cur.fetchone()
-    conn.close()
-    if r:
-        return {
-            'id': r[0],
-            'credential_id': r[1],
-            'public_key': r[2],
-            'sign_count': r[3],
-            'transports': r[4],
-            'created_at': r[5]
-        }
-    return None
+    with _LOCK:
+        _sync_cache()
+        return _CRED_CACHE.get(credential_id)
 
 
 def update_sign_count(credential_id: str, sign_count: int):
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute('UPDATE credentials SET sign_count = ? WHERE credential_id = ?', (sign_count, credential_id))
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        _sync_cache()
+        _CONN.execute('UPDATE credentials SET sign_count = ? WHERE credential_id = ?', (sign_count, credential_id))
+        cred = _CRED_CACHE.get(credential_id)
+        if cred is not None:
+            cred['sign_count'] = sign_count
 
 
 def delete_credential(credential_id: str):
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute('DELETE FROM credentials WHERE credential_id = ?', (credential_id,))
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        _sync_cache()
+        _CONN.execute('DELETE FROM credentials WHERE credential_id = ?', (credential_id,))
+        _CRED_CACHE.pop(credential_id, None)
 
 
 # initialize DB when imported
@@ -73,6 +73,7 @@ export default function LoginPage() {
       const rawId = bufferToBase64url(cred.rawId);
 
       await apiClient.post('/api/auth/passkey/register/verify', {
+        flow_id: opts.flow_id,
         id: cred.id,
         rawId,
         type: cred.type,
@@ -232,6 +232,7 @@ export default function HomePage() {
                   const attestationObject = bufferToBase64url((cred as any).response.attestationObject);
                   const rawId = bufferToBase64url(cred.rawId);
                   await apiClient.post('/api/auth/passkey/register/verify', {
+                    flow_id: opts.flow_id,
                     id: cred.id,
                     rawId,
                     type: cred.type,
@@ -282,7 +283,7 @@ export default function HomePage() {
                         const clientDataJSON = bufferToBase64url(cred.response.clientDataJSON);
                         const attestationObject = bufferToBase64url((cred as any).response.attestationObject);
                         const rawId = bufferToBase64url(cred.rawId);
-                        await apiClient.post('/api/auth/passkey/register/verify', { id: cred.id, rawId, type: cred.type, response: { clientDataJSON, attestationObject } });
+                        await apiClient.post('/api/auth/passkey/register/verify', { flow_id: opts.flow_id, id: cred.id, rawId, type: cred.type, response: { clientDataJSON, attestationObject } });
                         alert('Passkey created successfully.');
                       } catch (err: any) { console.error('Create passkey failed:', err); alert('Passkey creation failed: ' + (err?.response?.data?.detail || err?.message || 'unknown')); }
                     }} className="glass-button text-white text-left w-full">Create Passkey</button>
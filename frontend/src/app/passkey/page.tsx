@@ -41,6 +41,7 @@ export default function PasskeyLoginPage() {
         const rawId = bufferToBase64url(assertion.rawId);
 
         const res = await apiClient.post('/api/auth/passkey/login/verify', {
+          flow_id: opts.flow_id,
           id: assertion.id,
           rawId,
           type: assertion.type,
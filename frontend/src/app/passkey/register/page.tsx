@@ -42,6 +42,7 @@ export default function PasskeyRegisterPage() {
         const rawId = bufferToBase64url(cred.rawId);
 
         await apiClient.post('/api/auth/passkey/register/verify', {
+          flow_id: opts.flow_id,
           id: cred.id,
           rawId,
           type: cred.type,
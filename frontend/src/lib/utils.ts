@@ -17,11 +17,12 @@ export function formatFileSize(bytes: number): string {
 }
 
 /**
- * Format date in a readable format
+ * Format date in a readable format.
+ * Numbers are treated as Unix timestamps in seconds.
  */
-export function formatDate(dateString: string): string {
+export function formatDate(value: string | number): string {
   try {
-    const date = new Date(dateString);
+    const date = new Date(typeof value === 'number' ? value * 1000 : value);
     const now = new Date();
     const diffTime = Math.abs(now.getTime() - date.getTime());
     const diffDays = Math.floor(diffTime / (1000 * 60 * 60 * 24));
@@ -36,7 +37,7 @@ export function formatDate(dateString: string): string {
       return date.toLocaleDateString();
     }
   } catch {
-    return dateString;
+    return String(value);
   }
 }
 
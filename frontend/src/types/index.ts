@@ -7,7 +7,7 @@ export interface FileInfo {
   path: string;
   is_directory: boolean;
   size?: number;
-  modified_time?: string;
+  modified_time?: number; // Unix timestamp in seconds
   file_type?: string;
 }
 